@@ -1,142 +1,198 @@
 import os
+import asyncio
 import logging
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify
-from werkzeug.middleware.proxy_fix import ProxyFix
-import json
+from quart import (
+    Quart, Response, render_template, make_response, request, session,
+    flash, redirect, url_for, jsonify
+)
+from hypercorn.middleware import ProxyFixMiddleware
 from tps_core import (
-    get_conn, add_raw, process_pending, recent, search_clean, 
-    count_stats, get_entry_detail, check_fts_available
+    get_conn, add_raw, process_pending, recent, search_clean,
+    count_stats, get_entry_detail, check_fts_available, json_loads
 )
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 
 # Create the app
-app = Flask(__name__)
+app = Quart(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "tps-dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.asgi_app = ProxyFixMiddleware(app.asgi_app, mode="legacy", trusted_hops=1)
+
+@app.template_filter('from_json')
+def from_json(value):
+    """Parse stored metadata JSON in templates"""
+    return json_loads(value) if value else {}
+
+# -----------------------
+# Blocking DB work (run via asyncio.to_thread)
+# -----------------------
+# Each executor thread gets its own pooled connection from get_conn(), so
+# independent reads can be gathered and run concurrently under WAL.
+def _recent(limit, offset=0):
+    return recent(get_conn(), limit, offset)
+
+def _count_stats():
+    return count_stats(get_conn())
+
+def _add_entry(text, auto_process):
+    conn = get_conn()
+    raw_id = add_raw(conn, text)
+    ok = err = None
+    if auto_process:
+        ok, err = process_pending(conn)
+    return raw_id, ok, err
+
+def _process_all():
+    return process_pending(get_conn())
+
+def _search(query):
+    conn = get_conn()
+    use_fts = check_fts_available(conn)
+    return search_clean(conn, query, use_fts)
+
+def _load_entry(entry_id):
+    return get_entry_detail(get_conn(), entry_id)
+
+# -----------------------
+# Routes
+# -----------------------
+def _not_modified(etag):
+    """True if the client already holds this version and no flash is waiting"""
+    # If-None-Match uses weak comparison (RFC 9110 section 13.1.2)
+    return request.if_none_match.contains_weak(etag) and '_flashes' not in session
+
+def _not_modified_response(etag):
+    # A 304 must carry the same ETag the full response would have sent
+    response = Response('', status=304)
+    response.set_etag(etag)
+    return response
+
+async def _render_with_etag(etag, template, **context):
+    response = await make_response(await render_template(template, **context))
+    response.set_etag(etag)
+    return response
 
 @app.route('/')
-def index():
+async def index():
     """Main dashboard showing recent entries and quick stats"""
     try:
-        conn = get_conn()
-        recent_entries = recent(conn, 10)
-        total, processed, errors = count_stats(conn)
+        recent_entries, (total, processed, errors) = await asyncio.gather(
+            asyncio.to_thread(_recent, 10), asyncio.to_thread(_count_stats))
         pending = total - processed - errors
-        conn.close()
-        
-        return render_template('index.html', 
+
+        return await render_template('index.html',
                              recent_entries=recent_entries,
-                             total=total, 
-                             processed=processed, 
+                             total=total,
+                             processed=processed,
                              errors=errors,
                              pending=pending)
     except Exception as e:
         app.logger.error(f"Error loading dashboard: {e}")
-        flash('Error loading dashboard', 'danger')
-        return render_template('index.html', 
-                             recent_entries=[], 
+        await flash('Error loading dashboard', 'danger')
+        return await render_template('index.html',
+                             recent_entries=[],
                              total=0, processed=0, errors=0, pending=0)
 
 @app.route('/entry', methods=['GET', 'POST'])
-def entry():
+async def entry():
     """Text entry form"""
     if request.method == 'POST':
-        text = request.form.get('text', '').strip()
+        form = await request.form
+        text = form.get('text', '').strip()
         if not text:
-            flash('Please enter some text', 'warning')
-            return render_template('entry.html')
-        
+            await flash('Please enter some text', 'warning')
+            return await render_template('entry.html')
+
         try:
-            conn = get_conn()
-            raw_id = add_raw(conn, text)
-            
+            auto_process = bool(form.get('auto_process'))
+            raw_id, ok, err = await asyncio.to_thread(_add_entry, text, auto_process)
+
             # Auto-process if requested
-            if request.form.get('auto_process'):
-                ok, err = process_pending(conn)
+            if auto_process:
                 if ok:
-                    flash(f'Text entry added and processed successfully (ID: {raw_id})', 'success')
+                    await flash(f'Text entry added and processed successfully (ID: {raw_id})', 'success')
                 else:
-                    flash(f'Text entry added (ID: {raw_id}) but processing failed', 'warning')
+                    await flash(f'Text entry added (ID: {raw_id}) but processing failed', 'warning')
             else:
-                flash(f'Text entry added successfully (ID: {raw_id})', 'success')
-            
-            conn.close()
+                await flash(f'Text entry added successfully (ID: {raw_id})', 'success')
+
             return redirect(url_for('index'))
-            
+
         except Exception as e:
             app.logger.error(f"Error adding entry: {e}")
-            flash('Error adding text entry', 'danger')
-    
-    return render_template('entry.html')
+            await flash('Error adding text entry', 'danger')
+
+    return await render_template('entry.html')
 
 @app.route('/process')
-def process():
+async def process():
     """Process pending entries"""
     try:
-        conn = get_conn()
-        ok, err = process_pending(conn)
-        conn.close()
-        
+        ok, err = await asyncio.to_thread(_process_all)
+
         if ok:
-            flash(f'Successfully processed {ok} entries', 'success')
+            await flash(f'Successfully processed {ok} entries', 'success')
         if err:
-            flash(f'{err} entries failed to process', 'warning')
+            await flash(f'{err} entries failed to process', 'warning')
         if not ok and not err:
-            flash('No pending entries to process', 'info')
-            
+            await flash('No pending entries to process', 'info')
+
     except Exception as e:
         app.logger.error(f"Error processing entries: {e}")
-        flash('Error processing entries', 'danger')
-    
+        await flash('Error processing entries', 'danger')
+
     return redirect(url_for('index'))
 
 @app.route('/search', methods=['GET', 'POST'])
-def search():
+async def search():
     """Search cleaned entries"""
     results = []
     query = ''
-    
+
     if request.method == 'POST':
-        query = request.form.get('query', '').strip()
+        form = await request.form
+        query = form.get('query', '').strip()
         if query:
             try:
-                conn = get_conn()
-                use_fts = check_fts_available(conn)
-                results = search_clean(conn, query, use_fts)
-                conn.close()
-                
+                results = await asyncio.to_thread(_search, query)
+
                 if not results:
-                    flash('No results found', 'info')
+                    await flash('No results found', 'info')
                 else:
-                    flash(f'Found {len(results)} results', 'success')
-                    
+                    await flash(f'Found {len(results)} results', 'success')
+
             except Exception as e:
                 app.logger.error(f"Error searching: {e}")
-                flash('Error performing search', 'danger')
-    
-    return render_template('search.html', results=results, query=query)
+                await flash('Error performing search', 'danger')
+
+    return await render_template('search.html', results=results, query=query)
 
 @app.route('/browse')
-def browse():
+async def browse():
     """Browse all entries with pagination"""
     page = request.args.get('page', 1, type=int)
     per_page = 20
     offset = (page - 1) * per_page
-    
+
     try:
-        conn = get_conn()
-        entries = recent(conn, per_page, offset)
-        total, processed, errors = count_stats(conn)
-        conn.close()
-        
+        # Counts change whenever the entries do, so they key the page version.
+        # They come from count_stats' per-process cache: writes in this process
+        # invalidate it at once, but after a write on another worker the ETag
+        # can lag by up to _STATS_TTL seconds. Counts are
+        # read before recent() (not gathered) so a 304 skips the listing query.
+        total, processed, errors = await asyncio.to_thread(_count_stats)
+        etag = f"browse-{page}-{total}-{processed}-{errors}"
+        if _not_modified(etag):
+            return _not_modified_response(etag)
+        entries = await asyncio.to_thread(_recent, per_page, offset)
+
         # Calculate pagination info
         total_pages = (total + per_page - 1) // per_page
         has_prev = page > 1
         has_next = page < total_pages
-        
-        return render_template('browse.html', 
+
+        return await _render_with_etag(etag, 'browse.html',
                              entries=entries,
                              page=page,
                              total_pages=total_pages,
@@ -145,41 +201,41 @@ def browse():
                              total=total)
     except Exception as e:
         app.logger.error(f"Error browsing entries: {e}")
-        flash('Error loading entries', 'danger')
-        return render_template('browse.html', entries=[], page=1, total_pages=0, 
+        await flash('Error loading entries', 'danger')
+        return await render_template('browse.html', entries=[], page=1, total_pages=0,
                              has_prev=False, has_next=False, total=0)
 
 @app.route('/entry/<int:entry_id>')
-def view_entry(entry_id):
+async def view_entry(entry_id):
     """View detailed entry information"""
     try:
-        conn = get_conn()
-        entry = get_entry_detail(conn, entry_id)
-        conn.close()
-        
+        entry = await asyncio.to_thread(_load_entry, entry_id)
+
         if not entry:
-            flash('Entry not found', 'warning')
+            await flash('Entry not found', 'warning')
             return redirect(url_for('browse'))
-        
-        return render_template('entry_detail.html', entry=entry)
+
+        return await render_template('entry_detail.html', entry=entry)
     except Exception as e:
         app.logger.error(f"Error loading entry {entry_id}: {e}")
-        flash('Error loading entry', 'danger')
+        await flash('Error loading entry', 'danger')
         return redirect(url_for('browse'))
 
 @app.route('/stats')
-def stats():
+async def stats():
     """Detailed statistics page"""
     try:
-        conn = get_conn()
-        total, processed, errors = count_stats(conn)
+        # Cached counts key the page version; see browse() for the trade-offs
+        total, processed, errors = await asyncio.to_thread(_count_stats)
+        etag = f"stats-{total}-{processed}-{errors}"
+        if _not_modified(etag):
+            return _not_modified_response(etag)
         pending = total - processed - errors
-        
+
         # Get recent activity
-        recent_entries = recent(conn, 20)
-        conn.close()
-        
-        return render_template('stats.html', 
+        recent_entries = await asyncio.to_thread(_recent, 20)
+
+        return await _render_with_etag(etag, 'stats.html',
                              total=total,
                              processed=processed,
                              errors=errors,
@@ -187,8 +243,8 @@ def stats():
                              recent_entries=recent_entries)
     except Exception as e:
         app.logger.error(f"Error loading stats: {e}")
-        flash('Error loading statistics', 'danger')
-        return render_template('stats.html', 
+        await flash('Error loading statistics', 'danger')
+        return await render_template('stats.html',
                              total=0, processed=0, errors=0, pending=0,
                              recent_entries=[])
 
@@ -8,10 +8,17 @@ import sqlite3
 import json
 import os
 import re
-import datetime
 import pathlib
+import threading
+import collections
+import time
 from typing import Tuple, List, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # -----------------------
 # Configuration
 # -----------------------
@@ -24,7 +31,19 @@ DB_PATH = os.environ.get("TPS_DB", str(DEFAULT_DIR / "tps_app.db"))
 # -----------------------
 def now_iso() -> str:
     """Return current UTC timestamp in ISO format"""
-    return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+def json_dumps(obj) -> str:
+    """Serialize to a JSON string, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+def json_loads(data):
+    """Parse a JSON string, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 # -----------------------
 # Database Schema
@@ -40,6 +59,8 @@ CREATE TABLE IF NOT EXISTS raw_entries (
   status TEXT NOT NULL DEFAULT 'pending'  -- pending | processed | error
 );
 
+CREATE INDEX IF NOT EXISTS idx_raw_status ON raw_entries(status);
+
 CREATE TABLE IF NOT EXISTS cleaned_entries (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   raw_id INTEGER NOT NULL UNIQUE,
@@ -75,13 +96,38 @@ def maybe_create_fts5(conn: sqlite3.Connection) -> bool:
     except sqlite3.OperationalError:
         return False
 
+# Per-connection tuning applied to every pooled handle
+PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+PRAGMA mmap_size=268435456;
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
 def get_conn() -> sqlite3.Connection:
-    """Get database connection with schema initialized"""
-    conn = sqlite3.connect(DB_PATH)
+    """Get this thread's cached database connection, initializing the schema once"""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    # Autocommit mode: multi-statement writes manage BEGIN/COMMIT explicitly
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None,
+                           cached_statements=256)
     conn.row_factory = sqlite3.Row
-    conn.executescript(DDL)
-    conn.commit()
-    maybe_create_fts5(conn)
+    conn.executescript(PRAGMAS)
+    with _init_lock:
+        if not _initialized:
+            conn.executescript(DDL)
+            maybe_create_fts5(conn)
+            conn.execute("ANALYZE")
+            _initialized = True
+    conn.execute("PRAGMA foreign_keys=ON")
+    _local.conn = conn
     return conn
 
 def check_fts_available(conn: sqlite3.Connection) -> bool:
@@ -95,50 +141,81 @@ def check_fts_available(conn: sqlite3.Connection) -> bool:
 # -----------------------
 # Text Processing (AI Cleaning Stub)
 # -----------------------
+_WS_RE = re.compile(r"[ \u00A0]+")
+_CR_RE = re.compile(r"\r\n?")
+_TOKEN_RE = re.compile(r"(#?)(\w+)")
+_QUOTE_TBL = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2019": "'"})
+_ASCII_TBL = str.maketrans({"\t": " ", "\r": "\n"})
+_SPACES_RE = re.compile(r" {2,}")
+
+# One alternation in priority order: each character matches its highest-priority
+# class, so the best group index seen over a single scan picks the language
+_LANG_RE = re.compile(
+    r"([А-Яа-яЁё])|([ぁ-ゟ゠-ヿ一-鿿])|([áéíóúñü¿¡])|([àâäéèêëîïôöùûüÿç])|([äöüß])"
+)
+_LANG_NAMES = ("Russian", "Japanese/Chinese", "Spanish", "French", "German", "English")
+
 def simple_normalize(text: str) -> str:
     """Normalize whitespace and quotes"""
+    if text.isascii():
+        # No NBSP or curly quotes possible: one translate plus a space-run collapse
+        t = text.replace("\r\n", "\n").translate(_ASCII_TBL)
+        return _SPACES_RE.sub(" ", t).strip()
     t = text.replace("\t", " ")
-    t = re.sub(r"[ \u00A0]+", " ", t)
-    t = re.sub(r"\r\n?", "\n", t)
+    t = _WS_RE.sub(" ", t)
+    t = _CR_RE.sub("\n", t)
     t = t.strip()
-    t = t.replace(""", '"').replace(""", '"').replace("'", "'")
+    t = t.translate(_QUOTE_TBL)
     return t
 
 def infer_language_guess(text: str) -> str:
     """Simple language detection based on character patterns"""
-    if re.search(r"[А-Яа-яЁё]", text): return "Russian"
-    if re.search(r"[ぁ-ゟ゠-ヿ一-鿿]", text): return "Japanese/Chinese"
-    if re.search(r"[áéíóúñü¿¡]", text): return "Spanish"
-    if re.search(r"[àâäéèêëîïôöùûüÿç]", text): return "French"
-    if re.search(r"[äöüß]", text): return "German"
-    return "English"
+    if text.isascii():
+        return "English"
+    best = len(_LANG_NAMES) - 1
+    for m in _LANG_RE.finditer(text):
+        best = min(best, m.lastindex - 1)
+        if best == 0:
+            break
+    return _LANG_NAMES[best]
 
-def extract_tags(text: str) -> List[str]:
-    """Extract hashtags and significant words as tags"""
-    tags = re.findall(r"#(\w+)", text)
-    tokens = re.findall(r"\b[a-zA-Z]{5,}\b", text.lower())
-    for tok in tokens[:5]:
+def _scan_words(text: str) -> Tuple[int, List[str]]:
+    """Single pass over word tokens; return (word_count, tags)"""
+    word_count = 0
+    tags = []
+    tokens = []
+    for m in _TOKEN_RE.finditer(text):
+        word_count += 1
+        hashtag, word = m.groups()
+        if hashtag:
+            tags.append(word)
+        # Checked before lowercasing: words whose non-ASCII letters lowercase
+        # to ASCII (e.g. U+0130 or the Kelvin sign U+212A) are not tag candidates
+        if len(tokens) < 5 and len(word) >= 5 and word.isascii() and word.isalpha():
+            tokens.append(word.lower())
+    for tok in tokens:
         if tok not in tags:
             tags.append(tok)
-    return list(dict.fromkeys(tags))[:10]
+    return word_count, list(dict.fromkeys(tags))[:10]
+
+def extract_tags(text: str) -> List[str]:
+    """Extract hashtags and significant words as tags"""
+    return _scan_words(text)[1]
 
-def tps_ai_clean(raw_text: str) -> Tuple[str, dict]:
+def tps_ai_clean(raw_text: str, processed_at: Optional[str] = None) -> Tuple[str, dict]:
     """
     Main text cleaning function - replace this with actual AI processing
     Returns (cleaned_text, metadata_dict)
     """
     cleaned = simple_normalize(raw_text)
     
-    # Count words and characters
-    word_count = len(re.findall(r"\w+", cleaned))
+    # Count words and extract tags in one pass
+    word_count, tags = _scan_words(cleaned)
     char_count = len(cleaned)
     
-    # Detect language
+    # Detect language (skipped entirely for ASCII text)
     language = infer_language_guess(cleaned)
     
-    # Extract tags
-    tags = extract_tags(cleaned)
-    
     # Calculate reading time (assuming 200 words per minute)
     reading_time = max(1, round(word_count / 200))
     
@@ -149,7 +226,7 @@ def tps_ai_clean(raw_text: str) -> Tuple[str, dict]:
         "language_guess": language,
         "tags": tags,
         "reading_time_minutes": reading_time,
-        "processed_at": now_iso()
+        "processed_at": processed_at or now_iso()
     }
     
     return cleaned, meta
@@ -164,77 +241,116 @@ def add_raw(conn: sqlite3.Connection, text: str) -> int:
         (text, now_iso()),
     )
     conn.commit()
+    _invalidate_stats()
     return cur.lastrowid
 
 def process_pending(conn: sqlite3.Connection) -> Tuple[int, int]:
-    """Process all pending raw entries through AI cleaning"""
-    rows = conn.execute("SELECT * FROM raw_entries WHERE status='pending' ORDER BY id").fetchall()
-    ok = err = 0
-    
-    for r in rows:
-        try:
-            cleaned, meta = tps_ai_clean(r["text"])
-            conn.execute(
-                "INSERT INTO cleaned_entries(raw_id, clean_text, metadata_json, created_at) VALUES (?, ?, ?, ?)",
-                (r["id"], cleaned, json.dumps(meta, ensure_ascii=False), now_iso()),
-            )
-            conn.execute("UPDATE raw_entries SET status='processed' WHERE id=?", (r["id"],))
-            ok += 1
-        except Exception as e:
-            print(f"Error processing entry {r['id']}: {e}")
-            conn.execute("UPDATE raw_entries SET status='error' WHERE id=?", (r["id"],))
-            err += 1
+    """
+    Process all pending raw entries through AI cleaning in a single transaction.
+    If the connection already has a transaction open, the batch joins it and
+    commits it (or rolls it back on failure) rather than starting its own.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("SELECT * FROM raw_entries WHERE status='pending' ORDER BY id").fetchall()
+        # Rows in one batch share a timestamp
+        ts = now_iso()
+        inserts = []
+        ok_ids = []
+        err_ids = []
+        
+        for r in rows:
+            try:
+                cleaned, meta = tps_ai_clean(r["text"], ts)
+                inserts.append((r["id"], cleaned, json_dumps(meta), ts))
+                ok_ids.append((r["id"],))
+            except Exception as e:
+                print(f"Error processing entry {r['id']}: {e}")
+                err_ids.append((r["id"],))
+        
+        # Upsert so an entry re-queued as pending replaces its cleaned row
+        # (the cleaned_au trigger keeps FTS in sync) instead of failing the batch
+        conn.executemany(
+            """INSERT INTO cleaned_entries(raw_id, clean_text, metadata_json, created_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(raw_id) DO UPDATE SET clean_text=excluded.clean_text,
+                   metadata_json=excluded.metadata_json, created_at=excluded.created_at""",
+            inserts,
+        )
+        conn.executemany("UPDATE raw_entries SET status='processed' WHERE id=?", ok_ids)
+        conn.executemany("UPDATE raw_entries SET status='error' WHERE id=?", err_ids)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _invalidate_stats()
     
-    conn.commit()
-    return ok, err
+    return len(ok_ids), len(err_ids)
 
-def recent(conn: sqlite3.Connection, limit: int = 10, offset: int = 0):
-    """Get recent raw entries with processing status"""
-    return conn.execute("""
+# Listing rows are converted once at the query boundary so templates get
+# plain attribute access instead of sqlite3.Row's item lookup fallback
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor yielding plain tuples, bypassing the connection's sqlite3.Row factory"""
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+RecentRow = collections.namedtuple(
+    "RecentRow", "id text_preview status created_at has_clean clean_id metadata_json")
+SearchRow = collections.namedtuple(
+    "SearchRow", "id raw_id clean_text_preview metadata_json created_at raw_created_at")
+
+def recent(conn: sqlite3.Connection, limit: int = 10, offset: int = 0) -> List[RecentRow]:
+    """Get recent raw entries with processing status (previews only; see get_entry_detail)"""
+    cur = _tuple_cursor(conn).execute("""
         SELECT r.id, 
                CASE 
                  WHEN length(r.text) > 100 THEN substr(r.text,1,100) || '...'
                  ELSE r.text
                END AS text_preview,
-               r.text,
                r.status, 
                r.created_at,
-               ce.clean_text IS NOT NULL AS has_clean,
+               ce.id IS NOT NULL AS has_clean,
                ce.id as clean_id,
                ce.metadata_json
         FROM raw_entries r
         LEFT JOIN cleaned_entries ce ON ce.raw_id=r.id
         ORDER BY r.id DESC 
-        LIMIT ? OFFSET ?""", (limit, offset)).fetchall()
+        LIMIT ? OFFSET ?""", (limit, offset))
+    return list(map(RecentRow._make, cur))
 
-def search_clean(conn: sqlite3.Connection, query: str, use_fts: bool):
-    """Search cleaned entries using FTS5 or LIKE"""
+def search_clean(conn: sqlite3.Connection, query: str, use_fts: bool) -> List[SearchRow]:
+    """Search cleaned entries using FTS5 (ranked by BM25) or LIKE"""
     if use_fts:
-        return conn.execute("""
+        # Isolate the MATCH in a CTE so the planner always drives from the FTS index
+        cur = _tuple_cursor(conn).execute("""
+            WITH fts_matches AS (
+                SELECT rowid, bm25(cleaned_entries_fts) AS score
+                FROM cleaned_entries_fts
+                WHERE cleaned_entries_fts MATCH ?
+                ORDER BY score LIMIT 50
+            )
             SELECT ce.id, ce.raw_id, 
                    CASE 
                      WHEN length(ce.clean_text) > 200 THEN substr(ce.clean_text,1,200) || '...'
                      ELSE ce.clean_text
                    END AS clean_text_preview,
-                   ce.clean_text,
                    ce.metadata_json, 
                    ce.created_at,
                    r.created_at as raw_created_at
-            FROM cleaned_entries ce
-            JOIN cleaned_entries_fts f ON f.rowid = ce.id
+            FROM fts_matches fm
+            JOIN cleaned_entries ce ON ce.id = fm.rowid
             JOIN raw_entries r ON r.id = ce.raw_id
-            WHERE cleaned_entries_fts MATCH ?
-            ORDER BY ce.id DESC LIMIT 50
-        """, (query,)).fetchall()
+            ORDER BY fm.score
+        """, (query,))
     else:
         q = f"%{query}%"
-        return conn.execute("""
+        cur = _tuple_cursor(conn).execute("""
             SELECT ce.id, ce.raw_id, 
                    CASE 
                      WHEN length(ce.clean_text) > 200 THEN substr(ce.clean_text,1,200) || '...'
                      ELSE ce.clean_text
                    END AS clean_text_preview,
-                   ce.clean_text,
                    ce.metadata_json, 
                    ce.created_at,
                    r.created_at as raw_created_at
@@ -242,7 +358,8 @@ def search_clean(conn: sqlite3.Connection, query: str, use_fts: bool):
             JOIN raw_entries r ON r.id = ce.raw_id
             WHERE ce.clean_text LIKE ?
             ORDER BY ce.id DESC LIMIT 50
-        """, (q,)).fetchall()
+        """, (q,))
+    return list(map(SearchRow._make, cur))
 
 def get_entry_detail(conn: sqlite3.Connection, raw_id: int) -> Optional[sqlite3.Row]:
     """Get detailed information for a specific entry"""
@@ -254,9 +371,34 @@ def get_entry_detail(conn: sqlite3.Connection, raw_id: int) -> Optional[sqlite3.
         WHERE r.id = ?
     """, (raw_id,)).fetchone()
 
+# Process-wide cache for the app's database (DB_PATH): it ignores which
+# connection is passed in, so callers using another database must not rely on it.
+# "gen" is bumped on every invalidation; a query that raced with a write does not
+# store its (possibly stale) result.
+_STATS_TTL = 2.0
+_stats_cache = {"val": None, "ts": 0.0, "gen": 0}
+_stats_lock = threading.Lock()
+
+def _invalidate_stats() -> None:
+    """Drop cached counts after the entry tables change"""
+    with _stats_lock:
+        _stats_cache["gen"] += 1
+        _stats_cache["val"] = None
+
 def count_stats(conn: sqlite3.Connection) -> Tuple[int, int, int]:
-    """Get entry counts by status"""
-    total = conn.execute("SELECT count(*) FROM raw_entries").fetchone()[0]
-    processed = conn.execute("SELECT count(*) FROM raw_entries WHERE status='processed'").fetchone()[0]
-    errors = conn.execute("SELECT count(*) FROM raw_entries WHERE status='error'").fetchone()[0]
-    return total, processed, errors
+    """Get entry counts by status (cached for _STATS_TTL seconds)"""
+    with _stats_lock:
+        val = _stats_cache["val"]
+        if val is not None and time.monotonic() - _stats_cache["ts"] < _STATS_TTL:
+            return val
+        gen = _stats_cache["gen"]
+    row = conn.execute("""
+        SELECT count(*) AS total,
+               sum(status='processed') AS processed,
+               sum(status='error') AS errors
+        FROM raw_entries""").fetchone()
+    val = (row[0], row[1] or 0, row[2] or 0)
+    with _stats_lock:
+        if _stats_cache["gen"] == gen:
+            _stats_cache["val"], _stats_cache["ts"] = val, time.monotonic()
+    return val